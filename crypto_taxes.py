@@ -1,50 +1,57 @@
 """This is a script that helps you do your taxes, hopefully.  Let me know if it helped you."""
 
-from itertools import groupby
+from itertools import chain, zip_longest
+from collections import defaultdict
 from decimal import Decimal
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from argparse import ArgumentParser
 import logging
+import sys
 from functools import partial
+from typing import Collection, Iterator, Union
+from operator import attrgetter
 
 from trade import Trade
 from execution import Execution
-from match import Matcher, Match, TransferFees, WaitingQueue
+from match import LeftoverQueue, Matcher, Match, TransferFees, WaitingQueue
 from price_data import PriceData
 
 """TODO: determine if file reading and object creation should be done in the module closer to the object"""
 
-SECONDS_PER_MINUTE = 60
-FUZZY_MATCH_PRICE = 0.4
+# deliberately the exact value of the float 0.4, as the price check has always compared against
+FUZZY_MATCH_PRICE = Decimal(0.4)
 
-PriceDict = dict[str, dict[str, Decimal]]
+PriceDict = dict[str, dict[date, Decimal]]
+"""A currency-keyed dictionary of prices keyed by calendar date"""
 
-def convert_date(date: str) -> datetime:
-    """Convert a string representing a date and time to a datetime object"""
-    date_object = datetime.strptime(date, '%Y-%m-%d %H:%M:%S')
+def convert_date(date_string: str) -> datetime:
+    """Convert a string representing a date and time (YYYY-mm-dd HH:MM:SS) to a datetime object"""
+    date_object = datetime.fromisoformat(date_string)
     return date_object
 
-def get_price_on_date(price_dictionary: PriceDict, currency: str, date: datetime) -> Decimal:
-    """Obtain the historical price for the currency on the date."""
-    date_ymd = date.strftime("%Y-%m-%d")
+def to_decimal(value: str) -> Decimal:
+    """Convert a number string, which may contain thousands separators, to a Decimal"""
+    return Decimal(value.replace(',', '') if ',' in value else value)
 
-    try:
-        return price_dictionary[currency][date_ymd]
-    except KeyError:
-        logging.debug("Price alert: %s not found on %s", currency, date)
+def get_price_on_date(price_dictionary: PriceDict, currency: str, price_date: datetime) -> Decimal:
+    """Obtain the historical price for the currency on the date."""
+    prices = price_dictionary.get(currency)
+    price = prices.get(price_date.date()) if prices is not None else None
+    if price is None:
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug("Price alert: %s not found on %s", currency, price_date)
+        return 0
 
-    return 0
+    return price
 
-def read_file(file_name: str) -> list[str]:
-    """Read a file and slurp the lines"""
+def read_file(file_name: str) -> Iterator[str]:
+    """Read a file, yielding its lines one at a time"""
     logging.debug('Reading from %s', file_name)
-    lines = []
     try:
         with open(file_name, 'rt', encoding='UTF8') as infile:
-            lines = infile.readlines()
+            yield from infile
     except FileNotFoundError:
         logging.error('File not found: %s', file_name)
-    return lines
 
 def get_historical_prices(price_file: str) -> PriceDict:
     """Read a file and return a 2 level hashmap of currency -> date -> price"""
@@ -52,89 +59,106 @@ def get_historical_prices(price_file: str) -> PriceDict:
     currency_dict: PriceDict = {}
     currency_idx: dict[int, str] = {}
 
-    lines = read_file(price_file)
+    rows = [line.rstrip().split("\t") for line in read_file(price_file)]
+    if not rows:
+        return currency_dict
+
+    # first line holds the currencies and their indices
+    (_, *currencies), *rows = rows
+    for (idx, currency) in enumerate(currencies):
+        # only accept XXX OPEN or XXX
+        if ' ' in currency and ' OPEN' not in currency:
+            continue
+        currency = currency.split(' ')[0]
+
+        logging.debug('  found currency %s', currency)
+
+        currency_idx[idx] = currency
+        currency_dict[currency] = {}
 
-    first_line = True
-    for date, *values in (line.rstrip().split("\t") for line in lines):
-        # if first line, add currencies and indices
-        if first_line:
-            for (idx, currency) in enumerate(values):
-                # only accept XXX OPEN or XXX
-                if ' ' in currency and ' OPEN' not in currency:
-                    continue
-                currency = currency.split(' ')[0]
+    if not rows:
+        return currency_dict
 
-                logging.debug('  found currency %s', currency)
+    # transpose into date and price columns, padding rows that rstrip() shortened
+    dates, *columns = zip_longest(*rows, fillvalue='')
+    currency_idx = { idx: currency for idx, currency in currency_idx.items() if idx < len(columns) }
 
-                currency_idx[idx] = currency
-                currency_dict[currency] = {}
-            first_line = False
+    # parse each date once, skipping rows that have no price to keep or a malformed date
+    days: list[Union[date, None]] = []
+    for (line_number, (day, *prices)) in enumerate(zip(dates, *(columns[idx] for idx in currency_idx)), start=2):
+        if not any(prices):
+            days.append(None)
             continue
-        # else set the value of that date, for that currency, to the price.
-        for (idx, price) in enumerate(values):
-            if idx not in currency_idx:
-                continue
-            if price == '':
-                continue
-            price = price.replace(',', '')
+        try:
+            days.append(date.fromisoformat(day))
+        except ValueError:
+            logging.error('Invalid date in %s, skipping line %d: %s', price_file, line_number, '\t'.join(rows[line_number - 2]))
+            days.append(None)
 
-            price_int = Decimal(price)
-            currency_dict[currency_idx[idx]][date] = price_int
+    for (idx, currency) in currency_idx.items():
+        currency_dict[currency].update((day, to_decimal(price)) for day, price in zip(days, columns[idx]) if day is not None and price != '')
 
     return currency_dict
 
 def get_trades(trade_file: str) -> list[Trade]:
     """Read the trade file and convert it into a list of Trades"""
     trade_list = []
+    debug = logging.getLogger().isEnabledFor(logging.DEBUG)
 
-    lines = read_file(trade_file)
-    for exchange, date, pair, side, price, quantity, fee, fee_currency, fee_amt_base, fee_attached, *other_qty in (line.rstrip().split("\t") for line in lines):
-        alt_qty = Decimal(other_qty[0]) if other_qty else None
-        trade = Trade(exchange, convert_date(date), pair, side, Decimal(quantity.replace(',', '')), Decimal(price.replace(',', '')), Decimal(fee.replace(',', '')), fee_currency, Decimal(fee_amt_base.replace(',', '')), fee_attached == 'True', alt_qty)
-        logging.debug('  found trade %s', trade)
+    for exchange, trade_date, pair, side, price, quantity, fee, fee_currency, fee_amt_base, fee_attached, *other_qty in (line.rstrip().split("\t") for line in read_file(trade_file)):
+        alt_qty = to_decimal(other_qty[0]) if other_qty else None
+        trade = Trade(sys.intern(exchange), convert_date(trade_date), pair, sys.intern(side), to_decimal(quantity), to_decimal(price), to_decimal(fee), sys.intern(fee_currency), to_decimal(fee_amt_base), fee_attached == 'True', alt_qty)
+        if debug:
+            logging.debug('  found trade %s', trade)
         trade_list.append(trade)
 
     return trade_list
 
 def get_transfers(transfer_file: str) -> WaitingQueue:
     """Read the transfer file and convert it into a list of Transfers"""
-    transfers: WaitingQueue = {}
-
-    lines = read_file(transfer_file)
-    for date, dest, src, asset, _, fee in (line.rstrip().split("\t") for line in lines):
-        transfer = Execution(f'{src}/{dest}', convert_date(date), asset, 'Transfer', quantity=Decimal(fee.replace(',', '')))
-        logging.debug('  found transfer %s', transfer)
-        if not asset in transfers:
-            transfers[asset] = []
+    transfers: WaitingQueue = defaultdict(list)
+    debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+
+    for transfer_date, dest, src, asset, _, fee in (line.rstrip().split("\t") for line in read_file(transfer_file)):
+        transfer = Execution(sys.intern(f'{src}/{dest}'), convert_date(transfer_date), sys.intern(asset), 'Transfer', quantity=to_decimal(fee))
+        if debug:
+            logging.debug('  found transfer %s', transfer)
         transfers[asset].append(transfer)
 
-    return transfers
+    return dict(transfers)
 
-def calculate_aggregate(executions: list[Execution]) -> tuple[Decimal, Decimal, Decimal]:
+def calculate_aggregate(executions: Collection[Execution]) -> tuple[Decimal, Decimal, Decimal]:
     """Given a list of executions, return the total quantity, average price, and total fees"""
-    total_qty = 0
-    total_amt = 0
-    total_fees = 0
-    for execution in executions:
-        total_qty += execution.quantity
-        total_amt += execution.quantity * execution.price
-        total_fees += execution.fee
+    total_qty = sum(execution.quantity for execution in executions)
+    total_amt = sum(execution.quantity * execution.price for execution in executions)
+    total_fees = sum(execution.fee for execution in executions)
 
     return total_qty, total_amt / total_qty, total_fees
 
 def split_trades(trades: list[Trade], prices: PriceData, excl_fiat: list[str]) -> list[Execution]:
     """Go over each Trade and split it into its (1 or 2) normalized Executions, building up a queue for each asset type"""
+    excluded = frozenset(excl_fiat)
     executions: list[Execution] = [
         trade for trade in
-            # flatten normalized execution tuple
-            sum([trade.normalize_executions(prices) for trade in trades], ())
+            # flatten normalized execution tuples
+            chain.from_iterable(trade.normalize_executions(prices) for trade in trades)
         # filter out None and excluded
-        if trade is not None and trade.asset not in excl_fiat
+        if trade is not None and trade.asset not in excluded
     ]
     return executions
 
+def group_executions(executions: list[Execution]) -> WaitingQueue:
+    """Bucket executions by asset in a single pass, keeping their relative order within each asset"""
+    grouped: WaitingQueue = defaultdict(list)
+    for execution in executions:
+        grouped[execution.asset].append(execution)
+    # matching walks the assets in dict order
+    return dict(sorted(grouped.items()))
+
 def merge_executions(executions: WaitingQueue, merge_minutes: int) -> WaitingQueue:
-    """Create a new dict where the executions for each asset have been merged if they meet certain criteria"""
+    """Create a new dict where the executions for each asset have been merged if they meet certain criteria, or return the input dict unchanged if merge_minutes is 0"""
+    if not merge_minutes:
+        return executions
     merged_executions: WaitingQueue = { asset: merge_executions_helper(asset_executions, merge_minutes) for asset, asset_executions in executions.items() }
     return merged_executions
 
@@ -142,10 +166,11 @@ def merge_executions_helper(executions: list[Execution], merge_minutes: int) ->
     """Given a list of executions, create a new minimized/merged list based on attribute closeness criteria"""
     # add each execution, comparing to top
     merged_execution_list: list[Execution] = []
+    window = timedelta(minutes=merge_minutes)
     for execution in executions:
-        if merged_execution_list and merge_minutes:
+        if merged_execution_list:
             previous = merged_execution_list[-1]
-            if previous.exchange == execution.exchange and previous.side == execution.side and are_prices_close(previous, execution) and are_times_close(previous, execution, merge_minutes):
+            if previous.exchange == execution.exchange and previous.side == execution.side and are_times_close(previous, execution, window) and are_prices_close(previous, execution):
                 previous.merge(execution)
                 continue
         # append if we didn't merge
@@ -154,26 +179,28 @@ def merge_executions_helper(executions: list[Execution], merge_minutes: int) ->
 
 def merge_transfers(executions: WaitingQueue, transfers: WaitingQueue) -> WaitingQueue:
     """Merge dicts of executions and transfers together, sorting by date"""
-    merged: WaitingQueue = { asset: sorted(executions[asset] + transfers.get(asset, []), key=lambda x: x.date) for asset in executions.keys() }
+    merged: WaitingQueue = { asset: sorted(executions[asset] + transfers.get(asset, []), key=attrgetter('date')) for asset in executions.keys() }
     return merged
 
 def are_prices_close(first: Execution, second: Execution) -> bool:
     """Return True if the prices are within a certain % of each other"""
-    return abs(first.price - second.price) / first.price < FUZZY_MATCH_PRICE if first.price else False
+    if not first.price:
+        return False
+    if first.price == second.price:
+        return True
+    return abs(first.price - second.price) / first.price < FUZZY_MATCH_PRICE
 
-def are_times_close(first: Execution, second: Execution, minutes: int) -> bool:
-    """Return True if the execution times are within a certain range of each other"""
-    time_delta = first.date - second.date
-    seconds = abs(time_delta.days * 86400 + time_delta.seconds)
-    return seconds < minutes * SECONDS_PER_MINUTE
+def are_times_close(first: Execution, second: Execution, window: timedelta) -> bool:
+    """Return True if the execution times are within the window of each other"""
+    return abs(first.date - second.date) < window
 
-def print_output(matches: list[Match], leftovers: WaitingQueue, transfer_fees: TransferFees, output_type: str, currency_out: str):
+def print_output(matches: list[Match], leftovers: LeftoverQueue, transfer_fees: TransferFees, output_type: str, currency_out: str):
     """Print matches, unmatched executions, and the basis"""
     # Print matches
     if output_type == 'match':
-        for match in matches:
-            print(str(match))
+        sys.stdout.write(''.join(f'{match}\n' for match in matches))
     else:
+        lines: list[str] = []
         for currency in sorted(leftovers.keys()):
             executions = leftovers[currency]
             if len(executions) == 0:
@@ -182,10 +209,10 @@ def print_output(matches: list[Match], leftovers: WaitingQueue, transfer_fees: T
             if output_type in ('basis', 'summary'):
                 total_qty, avg_px, total_fees = calculate_aggregate(executions)
                 total_qty -= transfer_fees[currency] if currency in transfer_fees else 0
-                print(f"{currency} : {total_qty:.4f} @ {currency_out} {avg_px:.4f} with {currency_out} {total_fees:.2f} fees")
+                lines.append(f"{currency} : {total_qty:.4f} @ {currency_out} {avg_px:.4f} with {currency_out} {total_fees:.2f} fees\n")
             if output_type in ('unmatched', 'summary'):
-                for execution in executions:
-                    print(f"  {execution}")
+                lines.extend(f"  {execution}\n" for execution in executions)
+        sys.stdout.write(''.join(lines))
 
 
 ### Main ###
@@ -233,7 +260,7 @@ def main():
 
     # Manipulate, filter and massage data.  Opting for functional methods instead of mutations
     raw_executions: list[Execution] = split_trades(trade_list, price_data, args.fiat)
-    raw_executions_dict: WaitingQueue = { k: list(v) for k, v in groupby(sorted(raw_executions, key=lambda y: y.asset), lambda x: x.asset) }
+    raw_executions_dict: WaitingQueue = group_executions(raw_executions)
     merged_executions_dict: WaitingQueue = merge_executions(raw_executions_dict, args.merge_minutes)
     executions: WaitingQueue = merge_transfers(merged_executions_dict, transfers)
 
@@ -3,6 +3,9 @@
 from decimal import Decimal
 from datetime import datetime
 
+ZERO = Decimal(0)
+ONE = Decimal(1)
+
 
 class Execution:
     """A class that represents a normalized execution.
@@ -13,6 +16,8 @@ class Execution:
     A transfer therefore has 0 'fee'.
     """
 
+    __slots__ = ('exchange', 'date', 'side', 'asset', 'quantity', 'price', 'fee', 'merged')
+
     # fee_base should be 0 if the fee was taken directly in fiat.  If the fee was in this cryptocurrency, set to non-zero.  Not supported: fee in another cryptocurrency
     def __init__(self, exchange: str, date: datetime, asset: str, side: str, quantity: Decimal = 0, price: Decimal = 0, fee: Decimal = 0):
         self.exchange = exchange
@@ -24,9 +29,9 @@ class Execution:
         self.fee = fee
         self.merged = False
 
-    def merge(self, other) -> None:
+    def merge(self, other: 'Execution') -> None:
         """Merge this object with other if possible"""
-        if isinstance(other, Execution) and not other.is_transfer():
+        if not other.is_transfer():
             if self.price != other.price:
                 self.price = ((self.price * self.quantity) + (other.price * other.quantity)) / (self.quantity + other.quantity)
             self.quantity += other.quantity
@@ -51,10 +56,19 @@ def reduce_executions(first: Execution, second: Execution) -> tuple([Decimal, De
         (quantity reduced, fee reduced for 'first', fee reduced for 'second')
     """
     min_qty = min(first.quantity, second.quantity)
+    # nothing to reduce, and the shares below would divide 0 by 0
+    if not min_qty:
+        return min_qty, ZERO, ZERO
+
+    # the smaller side is fully consumed
+    if first.quantity <= second.quantity:
+        first_share, second_share = ONE, min_qty / second.quantity
+    else:
+        first_share, second_share = min_qty / first.quantity, ONE
 
     # reduce fees first since we depend on 'quantity' attribute in the calculation
-    first_reduce_fee = first.fee * (min_qty / first.quantity)
-    second_reduce_fee = second.fee * (min_qty / second.quantity)
+    first_reduce_fee = first.fee * first_share
+    second_reduce_fee = second.fee * second_share
     first.fee -= first_reduce_fee
     second.fee -= second_reduce_fee
 
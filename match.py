@@ -3,12 +3,15 @@
 from typing import Callable, Deque
 from collections import deque
 from decimal import Decimal
+from operator import itemgetter
 import logging
 
 from execution import Execution, reduce_executions
 
 class Match:
     """A class representing a match of a buy and sell"""
+    __slots__ = ('exchange_from', 'exchange_to', 'date_from', 'date_to', 'asset', 'settle_side', 'quantity', 'amount_open', 'amount_close', 'fee_open', 'fee_close', 'merged')
+
     TWOPLACES = Decimal('0.01')
     FOURPLACES = Decimal('0.0001')
 
@@ -19,20 +22,24 @@ class Match:
         self.date_to = second.date
         self.asset = first.asset
         self.settle_side = second.side
-        self.quantity = quantity.quantize(Match.FOURPLACES)
-        self.amount_open = (first.price * quantity).quantize(Match.TWOPLACES)
-        self.amount_close = (second.price * quantity).quantize(Match.TWOPLACES)
-        self.fee_open = fee_open.quantize(Match.TWOPLACES)
-        self.fee_close = fee_close.quantize(Match.TWOPLACES)
+        self.quantity = quantity
+        self.amount_open = first.price * quantity
+        self.amount_close = second.price * quantity
+        self.fee_open = fee_open
+        self.fee_close = fee_close
         self.merged = first.merged or second.merged
 
     # String representation of a match is actually the Form 8949 match format
     def __str__(self) -> str:
+        amount_open = self.amount_open.quantize(Match.TWOPLACES)
+        amount_close = self.amount_close.quantize(Match.TWOPLACES)
+        fee_open = self.fee_open.quantize(Match.TWOPLACES)
+        fee_close = self.fee_close.quantize(Match.TWOPLACES)
         return "\t".join(
             (
-                self.settle_side + " " + str(self.quantity) + " " + self.asset + " (" + self.exchange_from + " -> " + self.exchange_to + ")",
+                self.settle_side + " " + str(self.quantity.quantize(Match.FOURPLACES)) + " " + self.asset + " (" + self.exchange_from + " -> " + self.exchange_to + ")",
                 self.date_from.strftime('%m/%d/%Y'), self.date_to.strftime('%m/%d/%Y'),
-                str(self.amount_close - self.fee_close), str(self.amount_open + self.fee_open), 'M' if self.merged else '', '0', str(self.amount_close - self.amount_open - self.fee_open - self.fee_close)
+                str(amount_close - fee_close), str(amount_open + fee_open), 'M' if self.merged else '', '0', str(amount_close - amount_open - fee_open - fee_close)
             )
         )
 
@@ -40,20 +47,23 @@ class Match:
 WaitingQueue = dict[str, list[Execution]]
 """An asset-keyed dictionary of Executions in sorted order waiting to be matched"""
 
+LeftoverQueue = dict[str, Deque[Execution]]
+"""An asset-keyed dictionary of the Executions left unmatched, in working queue order"""
+
 TransferFees = dict[str, Decimal]
 """An asset-keyed dictionary of the total amount of the asset lost to transfer fees"""
 
-MatchResults = tuple[list[Match], WaitingQueue, TransferFees]
+MatchResults = tuple[list[Match], LeftoverQueue, TransferFees]
 """Results of matching are a list of Matches, the unmatched Executions, and the costs and fees of transfers"""
 
-PeekTop = Callable[[list[Execution]], Execution]
-"""Method that gives the 'top' of a list of Executions for some matching strategy"""
+PeekTop = Callable[[Deque[Execution]], Execution]
+"""Method that gives the 'top' of a queue of Executions for some matching strategy"""
 
-TakeTop = Callable[[list[Execution]], Execution]
-"""Method that takes the 'top' of a list of Executions for some matching strategy"""
+TakeTop = Callable[[Deque[Execution]], Execution]
+"""Method that takes the 'top' of a queue of Executions for some matching strategy"""
 
-AddTop = Callable[[list[Execution], Execution], None]
-"""Method that adds an Execution to the 'top' of a list of Executions for some matching strategy"""
+AddTop = Callable[[Deque[Execution], Execution], None]
+"""Method that adds an Execution to the 'top' of a queue of Executions for some matching strategy"""
 
 
 class Matcher:
@@ -75,46 +85,51 @@ class Matcher:
     def __match_fifo_lifo(self, peek_top: PeekTop, take_top: TakeTop, add_top: AddTop) -> MatchResults:
         """Match using fifo / lifo"""
         matches: list[Match] = []
-        leftovers: WaitingQueue = {}
+        leftovers: LeftoverQueue = {}
         xfer_fees: TransferFees = {}
 
+        xfer_update = self.xfer_update
+        match_helper = self.__match_helper
+        add_matches = matches.extend
+
         for (currency, executions) in self.queue.items():
             working_queue: Deque[Execution] = deque()
+            if executions:
+                xfer_fees[currency] = 0
             for execution in executions:
-                if not execution.asset in xfer_fees:
-                    xfer_fees[execution.asset] = 0
-
                 # if queue is empty, or top is same side, add
                 if len(working_queue) == 0 or peek_top(working_queue).side == execution.side:
                     add_top(working_queue, execution)
-                elif execution.is_transfer() and not self.xfer_update:
-                    xfer_fees[execution.asset] += execution.fee
+                elif execution.is_transfer() and not xfer_update:
+                    xfer_fees[currency] += execution.fee
                 else:
-                    matches.extend(self.__match_helper(working_queue, take_top, add_top, execution))
+                    add_matches(match_helper(working_queue, take_top, add_top, execution))
             if len(working_queue) > 0:
-                leftovers[currency] = list(working_queue)
+                leftovers[currency] = working_queue
 
         return matches, leftovers, xfer_fees
 
     def match_fifo(self) -> MatchResults:
         """Match using a FIFO strategy"""
-        return self.__match_fifo_lifo(lambda x: x[0], lambda x: x.popleft(), lambda x, y: x.appendleft(y))
+        return self.__match_fifo_lifo(itemgetter(0), deque.popleft, deque.appendleft)
 
     def match_lifo(self) -> MatchResults:
         """Match using a LIFO strategy"""
-        return self.__match_fifo_lifo(lambda x: x[-1], lambda x: x.pop(), lambda x, y: x.append(y))
+        return self.__match_fifo_lifo(itemgetter(-1), deque.pop, deque.append)
 
     def __match_helper(self, working_queue: Deque[Execution], take_top: TakeTop, add_top: AddTop, execution: Execution) -> list[Match]:
         """Create matches for a given execution"""
         matches: list[Match] = []
+        is_transfer = execution.is_transfer()
+        add_match = matches.append
         while True:
             first = take_top(working_queue)
 
             min_qty, fee_first, fee_exec = reduce_executions(first, execution)
 
-            if not execution.is_transfer():
-                match = Match(first, execution, min_qty, fee_first, fee_exec)
-                matches.append(match)
+            # nothing to report for a zero quantity, e.g. a transfer with no fee
+            if not is_transfer and min_qty:
+                add_match(Match(first, execution, min_qty, fee_first, fee_exec))
 
             if execution.quantity <= 0:
                 if first.quantity > 0:
@@ -123,7 +138,7 @@ class Matcher:
             # if the queue is EMPTY, we can add execution and break; else go back to top of loop
             if not working_queue:
                 # special log
-                if execution.is_transfer():
+                if is_transfer:
                     logging.error('Transfer was going to be 1st thing on queue so has been ignored  for %s', execution.asset)
                 else:
                     add_top(working_queue, execution)
@@ -6,6 +6,9 @@ from typing import Callable
 
 PriceLookup = Callable[[str, datetime], Decimal]
 
+ONE = Decimal(1)
+
+
 class PriceData:
     """A class that encapsulates price information and actions.
 
@@ -33,6 +36,8 @@ class PriceData:
         True if the currency is this PriceData's input or output currency, False otherwise
     """
 
+    __slots__ = ('lookup', 'currency_in', 'currency_out', 'currency_direct', '__same_inout', '__inout')
+
     def __init__(self, price_lookup: PriceLookup, currency_in: str, currency_out: str = None, currency_direct: bool = False):
         """
         Parameters
@@ -51,6 +56,8 @@ class PriceData:
         self.currency_in = currency_in
         self.currency_out = currency_out or currency_in
         self.currency_direct = currency_direct
+        self.__same_inout = self.currency_out == self.currency_in
+        self.__inout = frozenset((self.currency_in, self.currency_out))
 
 
     def lookup_price(self, date: datetime, currency: str = None, base_currency: str = None, units: Decimal = None) -> Decimal:
@@ -70,20 +77,24 @@ class PriceData:
 
         # Output as-is
         if currency is None or self.is_output_currency(currency):
-            return Decimal(1)
+            return ONE
 
         # Input to output (1 out = X in), then we should use EITHER the provided units, OR the lookup (preferring provided units)
-        input_to_output_price = self.lookup(self.currency_out, date) if self.currency_out != self.currency_in else Decimal(1)
         if self.is_input_currency(currency):
-            return units or input_to_output_price
+            return units or self.__input_to_output_price(date)
 
         # A/B pair.  Divide by IO price, since lookup(A) means 1A = X in, and IO means 1O = X in.  Lookup(A) / IO -> A/in / O/in -> A/in * in/O -> A/O
         if self.currency_direct or base_currency is None:
-            return self.lookup(currency, date) / input_to_output_price
+            price = self.lookup(currency, date)
+            return price if self.__same_inout else price / self.__input_to_output_price(date)
 
         # default recursive case, lookup base currency with no units
         return (units or 1) * self.lookup_price(date=date, currency=base_currency, base_currency=None, units=None)
 
+    def __input_to_output_price(self, date: datetime) -> Decimal:
+        """The price of 1 output currency in input currency"""
+        return ONE if self.__same_inout else self.lookup(self.currency_out, date)
+
     def is_input_currency(self, currency: str) -> bool:
         """Check if a given currency is the configured input currency"""
         return currency == self.currency_in
@@ -94,4 +105,4 @@ class PriceData:
 
     def is_inout_currency(self, currency: str) -> bool:
         """Check if a given currency is the configured input or output currency"""
-        return currency in (self.currency_in, self.currency_out)
+        return currency in self.__inout
@@ -3,11 +3,15 @@
 from decimal import Decimal
 from datetime import datetime
 import logging
+import sys
 from typing import Union
 
 from execution import Execution
 from price_data import PriceData
 
+ZERO = Decimal(0)
+
+
 class Trade:
     """A class that represents a trade, which is potentially cross-currency.
     A trade is represented as X/Y, so pair would be e.g. BTC/ETH or ADA/USD
@@ -48,6 +52,8 @@ class Trade:
         Attach the fee to the execution, and optionally reduce the execution's quantity by attribute fee.  Only 1 execution should have the fee attached.
     """
 
+    __slots__ = ('exchange', 'date', 'side', 'price', 'quantity', 'fee', 'fee_currency', 'fee_base', 'fee_attached', 'alt_qty', 'underlying', 'asset')
+
     def __init__(self, exchange: str, date: datetime, pair: str, side: str, quantity: Decimal, price: Decimal, fee: Decimal, fee_currency: str, fee_base: Decimal, fee_attached: bool, alt_qty: Decimal):
         self.exchange = exchange
         self.date = date
@@ -61,8 +67,8 @@ class Trade:
         self.alt_qty = alt_qty
 
         currencies = pair.split("/")
-        self.underlying = currencies[1]
-        self.asset = currencies[0]
+        self.underlying = sys.intern(currencies[1])
+        self.asset = sys.intern(currencies[0])
 
     def normalize_executions(self, price_data: PriceData) -> tuple[Union[Execution, None], Union[Execution, None], Union[Execution, None]]:
         """Normalize the executions this trade represents
@@ -75,14 +81,15 @@ class Trade:
         Sells are always counted.
         """
 
-        if self.side == 'Buy':
-            buy_quantity = self.quantity
-            sell_quantity = self.alt_qty or self.quantity * self.price
-        else:
-            buy_quantity = self.alt_qty or self.quantity * self.price
-            sell_quantity = self.quantity
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug("Normalizing execution %s %.4f %s/%s @ %s on %s", self.side, self.quantity, self.asset, self.underlying, self.price, self.date)
 
-        logging.debug("Normalizing execution %s %.4f %s @ %s on %s", self.side, self.quantity, f'{self.asset}/{self.underlying}', self.price, self.date)
+        # no executions if the currencies are input/output currencies already; they are to be ignored
+        is_asset_inout = price_data.is_inout_currency(self.asset)
+        is_underlying_inout = price_data.is_inout_currency(self.underlying)
+
+        if is_asset_inout and is_underlying_inout:
+            return (None,)
 
         """
             Say prices are in USD, and output is in JPY.
@@ -117,25 +124,18 @@ class Trade:
             Sometimes this error will benefit you, other times not.  It should be OK for taxes so long as you don't cherry-pick on a trade-by-trade basis, or year-by-year.
         """
 
-        # no executions if the currencies are input/output currencies already; they are to be ignored
-        is_asset_inout = price_data.is_inout_currency(self.asset)
-        is_underlying_inout = price_data.is_inout_currency(self.underlying)
-
-        if is_asset_inout and is_underlying_inout:
-            return (None,)
-
         exec_1: Execution = None
         exec_2: Execution = None
 
         if not is_asset_inout:
             # get top_px relative to the output currency
             top_px = price_data.lookup_price(date=self.date, currency=self.asset, base_currency=self.underlying, units=self.price)
-            exec_1 = Execution(self.exchange, self.date, self.asset, self.side, buy_quantity if self.side == 'Buy' else sell_quantity, top_px, Decimal(0))
+            exec_1 = Execution(self.exchange, self.date, self.asset, self.side, self.quantity, top_px, ZERO)
 
         if not is_underlying_inout:
             # 2-arg call to lookup_price means bottom_px_indirect is None, so we ignore it
             bottom_px = price_data.lookup_price(self.date, currency=self.underlying)
-            exec_2 = Execution(self.exchange, self.date, self.underlying, 'Sell' if self.side == 'Buy' else 'Buy', sell_quantity if self.side == 'Buy' else buy_quantity, bottom_px, Decimal(0))
+            exec_2 = Execution(self.exchange, self.date, self.underlying, 'Sell' if self.side == 'Buy' else 'Buy', self.alt_qty or self.quantity * self.price, bottom_px, ZERO)
 
         """Fee handling - it will attach to whichever part of the pair is self.fee_currency if possible.
 
@@ -143,24 +143,25 @@ class Trade:
         Otherwise it is SELL
         """
         # the actual amount of the fee in output currency
-        if self.fee_base > Decimal(0):
-            # TODO: this call makes an assumption that fee_base is in INPUT currency
-            fee_out = self.fee_base / price_data.lookup_price(self.date)
+        fee_px: Union[Decimal, None]
+        if self.fee_base > ZERO:
+            # TODO: this makes an assumption that fee_base is in INPUT currency
+            fee_out = self.fee_base
+            fee_px = None
         else:
-            fee_out = self.fee * price_data.lookup_price(date=self.date, currency=self.fee_currency)
+            fee_px = price_data.lookup_price(date=self.date, currency=self.fee_currency)
+            fee_out = self.fee * fee_px
 
-        fee_sell = self.__do_fees(price_data, exec_1, exec_2, fee_out)
+        fee_sell = self.__do_fees(price_data, exec_1, exec_2, fee_out, fee_px)
 
         return exec_1, exec_2, fee_sell
 
-    def __do_fees(self, price_data: PriceData, buy: Execution, sell: Execution, fee_out: Decimal) -> Union[Execution, None]:
-        attach_fee_to_buy = buy is not None and ((buy.asset == self.fee_currency) or sell is None or price_data.is_inout_currency(sell.asset))
-
+    def __do_fees(self, price_data: PriceData, buy: Execution, sell: Execution, fee_out: Decimal, fee_px: Union[Decimal, None] = None) -> Union[Execution, None]:
         # if we have a cryptocurrency fee and it's neither the buy nor sell currency
         fee_sell = None
-        if self.fee_currency not in (self.asset, self.underlying) and not price_data.is_inout_currency(self.fee_currency) and self.fee > 0:
-            fee_sell = Execution(self.exchange, self.date, self.fee_currency, 'Sell', self.fee, fee_out / self.fee, 0)
-        elif attach_fee_to_buy:
+        if self.fee_currency != self.asset and self.fee_currency != self.underlying and not price_data.is_inout_currency(self.fee_currency) and self.fee > 0:
+            fee_sell = Execution(self.exchange, self.date, self.fee_currency, 'Sell', self.fee, fee_px if fee_px is not None else fee_out / self.fee, 0)
+        elif buy is not None and (buy.asset == self.fee_currency or sell is None or price_data.is_inout_currency(sell.asset)):
             self.modify_fee(buy, fee_out)
         elif sell is not None:
             self.modify_fee(sell, fee_out)